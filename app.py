@@ -2,7 +2,7 @@ import streamlit as st
 from stmol import showmol
 import py3Dmol
 import numpy as np
-from utils.molecule_functions import Molecule,read_sdf_from_string,read_sdf_from_file,apply_rotation,calculate_contact
+from utils.molecule_functions import Molecule,read_sdf_from_string,read_sdf_from_file,apply_rotation,IncrementalContact
 from utils.chat_functions import chat_paper_AI
 
 #class Molecule:
@@ -160,7 +160,12 @@ def deploy_molecule():
     with zc:
         z_d=st.number_input('z direction',value=0)
     direction_vector = np.array([x_d, y_d, z_d])
-    max_displacement = calculate_contact(rotated_molecule, direction_vector)
+    # Keep the warm-started contact state while only the angles or direction change
+    molecule_key = generate_xyz_data(molecule)
+    if st.session_state.get('contact_key') != molecule_key:
+        st.session_state['contact_tracker'] = IncrementalContact(molecule)
+        st.session_state['contact_key'] = molecule_key
+    max_displacement = st.session_state['contact_tracker'].calculate(direction_vector, (angle_x, angle_y, angle_z))
     #displacement_vector = np.array([max_displacement, 0, 0])
     displacement_vector = max_displacement*direction_vector/np.linalg.norm(direction_vector)
 
@@ -0,0 +1,300 @@
+"""
+Local HTTP service for the molecular displacement calculation.
+
+    python service.py --port 8765 --workers 4
+
+POST /displacements with a JSON body containing either "sdf" (SDF text) or
+"coordinates" and "symbols", an optional "atom_radii" dictionary, a list of
+"directions" and an optional list of "rotations" (angles in degrees, as in the
+app). Rotations and directions are paired one to one; a single entry is used
+for every element of the other list. The answer is {"displacements": [...]}.
+
+GET /metrics returns request latency, throughput and batching statistics.
+The server only listens on 127.0.0.1.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from utils.molecule_functions import Molecule, read_sdf_from_string, rotation_matrix
+from utils.pair_functions import ContactBody, calculate_pair_contact
+
+HOST = '127.0.0.1'
+ATOM_RADII = {'C': 1.7, 'H': 1.2, 'O': 1.52, 'N': 1.55, 'S': 1.8}
+MAX_RADIUS = 10.0
+MAX_COORDINATE = 1e6
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+def molecule_from_request(payload):
+    if not isinstance(payload, dict):
+        raise ValueError("The request body must be a JSON object")
+    if 'sdf' in payload:
+        if not isinstance(payload['sdf'], str):
+            raise ValueError("sdf must be the text of an SDF file")
+        molecule_data = read_sdf_from_string(payload['sdf'])
+        coordinates = [data[:3] for data in molecule_data]
+        symbols = [data[3] for data in molecule_data]
+    else:
+        coordinates = payload['coordinates']
+        symbols = payload['symbols']
+    coordinates = np.asarray(coordinates, dtype=float)
+    if coordinates.ndim != 2 or coordinates.shape[1] != 3 or len(coordinates) == 0:
+        raise ValueError("Coordinates must be a non-empty list of [x, y, z] triples")
+    if not np.all(np.isfinite(coordinates)) or np.abs(coordinates).max() > MAX_COORDINATE:
+        raise ValueError(f"Coordinates must be finite and within {MAX_COORDINATE:g} A")
+    if not isinstance(symbols, list) or len(symbols) != len(coordinates) \
+            or not all(isinstance(symbol, str) for symbol in symbols):
+        raise ValueError("The molecule needs one element symbol per atom")
+    atom_radii = payload.get('atom_radii', ATOM_RADII)
+    if not isinstance(atom_radii, dict) or not all(
+            isinstance(radius, (int, float)) and not isinstance(radius, bool)
+            and 0 < radius <= MAX_RADIUS for radius in atom_radii.values()):
+        raise ValueError(f"atom_radii must map element symbols to numbers in (0, {MAX_RADIUS:g}]")
+    return Molecule(coordinates, symbols, atom_radii)
+
+
+def payload_key(payload):
+    """Content hash of the molecule fields of a request, taken before any parsing."""
+    if 'sdf' in payload:
+        fields = {'sdf': payload['sdf']}
+    else:
+        fields = {'coordinates': payload.get('coordinates'), 'symbols': payload.get('symbols')}
+    fields['atom_radii'] = payload.get('atom_radii', ATOM_RADII)
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def effective_directions(payload):
+    """Directions in the frame of the unrotated molecule, one per requested evaluation."""
+    directions = np.atleast_2d(np.asarray(payload['directions'], dtype=float))
+    rotations = np.atleast_2d(np.asarray(payload.get('rotations', [[0, 0, 0]]), dtype=float))
+    if directions.ndim != 2 or rotations.ndim != 2 or directions.shape[1] != 3 or rotations.shape[1] != 3:
+        raise ValueError("Directions and rotations must have three components")
+    if len(directions) != len(rotations) and 1 not in (len(directions), len(rotations)):
+        raise ValueError("Directions and rotations must have the same length or a single entry")
+    if not np.all(np.isfinite(rotations)):
+        raise ValueError("Rotations must be finite")
+    norms = np.linalg.norm(directions, axis=1)
+    if not np.all(np.isfinite(norms)) or np.any(norms == 0):
+        raise ValueError("Direction vectors must be finite and non-zero")
+    n = max(len(directions), len(rotations))
+    directions = np.broadcast_to(directions, (n, 3))
+    rotations = np.broadcast_to(rotations, (n, 3))
+    # Rotating the molecule by R is equivalent to using R^T v on the unrotated one.
+    return np.array([np.dot(direction, rotation_matrix(angles))
+                     for direction, angles in zip(directions, rotations)])
+
+
+class MoleculeCache:
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, payload):
+        key = payload_key(payload)
+        with self._lock:
+            entry = self._bodies.get(key)
+            owner = entry is None
+            if owner:
+                # Later requests for the same molecule wait on this instead of recomputing.
+                entry = Future()
+                self._bodies[key] = entry
+                while len(self._bodies) > self.max_size:
+                    self._bodies.popitem(last=False)
+            else:
+                self._bodies.move_to_end(key)
+        if owner:
+            try:
+                body = ContactBody(molecule_from_request(payload))
+                # Every batch for this molecule reuses the N^2 pair geometry.
+                body.self_geometry()
+                entry.set_result(body)
+            except Exception as error:
+                entry.set_exception(error)
+                with self._lock:
+                    if self._bodies.get(key) is entry:
+                        del self._bodies[key]
+        return key, entry.result()
+
+    def __len__(self):
+        return len(self._bodies)
+
+
+class Metrics:
+    def __init__(self, window=1000):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.evaluations = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_request(self, latency, ok):
+        with self._lock:
+            self.requests += 1
+            self.errors += 0 if ok else 1
+            self._latencies.append(latency)
+
+    def record_batch(self, n_requests, n_evaluations):
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += n_requests
+            self.evaluations += n_evaluations
+
+    def snapshot(self):
+        with self._lock:
+            uptime = time.time() - self.started
+            latencies = np.array(self._latencies) * 1000
+            return {
+                'uptime_s': uptime,
+                'requests': self.requests,
+                'errors': self.errors,
+                'evaluations': self.evaluations,
+                'requests_per_s': self.requests / uptime if uptime > 0 else 0.0,
+                'evaluations_per_s': self.evaluations / uptime if uptime > 0 else 0.0,
+                'batches': self.batches,
+                'mean_batch_size': self.batched_requests / self.batches if self.batches else 0.0,
+                'latency_ms': {
+                    'mean': float(latencies.mean()) if len(latencies) else 0.0,
+                    'p50': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+                    'p95': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+                    'max': float(latencies.max()) if len(latencies) else 0.0,
+                },
+            }
+
+
+class Coalescer:
+    """
+    Groups concurrent requests for the same molecule into one batched evaluation.
+
+    The first request for a molecule starts a drain job on the worker pool; requests
+    that arrive while it is running are queued and evaluated together in its next pass.
+    """
+
+    def __init__(self, executor, metrics):
+        self._executor = executor
+        self._metrics = metrics
+        self._pending = {}
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, body, directions):
+        future = Future()
+        with self._lock:
+            self._pending.setdefault(key, []).append((directions, future))
+            start = key not in self._running
+            self._running.add(key)
+        if start:
+            self._executor.submit(self._drain, key, body)
+        return future
+
+    def _drain(self, key, body):
+        while True:
+            with self._lock:
+                batch = self._pending.pop(key, [])
+                if not batch:
+                    self._running.discard(key)
+                    return
+            directions = np.concatenate([item[0] for item in batch])
+            try:
+                displacements = calculate_pair_contact(body, body, directions)
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            self._metrics.record_batch(len(batch), len(directions))
+            start = 0
+            for item_directions, future in batch:
+                future.set_result(displacements[start:start + len(item_directions)])
+                start += len(item_directions)
+
+
+class DisplacementHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status, content):
+        data = json.dumps(content, allow_nan=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        metrics = self.server.metrics.snapshot()
+        metrics['cached_molecules'] = len(self.server.cache)
+        self._send_json(200, metrics)
+
+    def do_POST(self):
+        if self.path != '/displacements':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        started = time.perf_counter()
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length < 0 or length > MAX_BODY_BYTES:
+                raise ValueError(f"Content-Length must be between 0 and {MAX_BODY_BYTES} bytes")
+            payload = json.loads(self.rfile.read(length))
+            if not isinstance(payload, dict):
+                raise ValueError("The request body must be a JSON object")
+            # Validate the cheap fields first so bad requests never reach the molecule cache.
+            directions = effective_directions(payload)
+            key, body = self.server.cache.get(payload)
+            displacements = self.server.coalescer.submit(key, body, directions).result()
+            if not np.all(np.isfinite(displacements)):
+                raise ArithmeticError("The evaluation produced non-finite displacements")
+        except (KeyError, TypeError, ValueError) as error:
+            self.server.metrics.record_request(time.perf_counter() - started, False)
+            self._send_json(400, {'error': str(error)})
+            return
+        except Exception as error:
+            self.server.metrics.record_request(time.perf_counter() - started, False)
+            self._send_json(500, {'error': f"{type(error).__name__}: {error}"})
+            return
+        self.server.metrics.record_request(time.perf_counter() - started, True)
+        self._send_json(200, {'molecule': key, 'displacements': displacements.tolist()})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(port=8765, workers=4, cache_size=128):
+    server = ThreadingHTTPServer((HOST, port), DisplacementHandler)
+    server.metrics = Metrics()
+    server.cache = MoleculeCache(cache_size)
+    server.executor = ThreadPoolExecutor(max_workers=workers)
+    server.coalescer = Coalescer(server.executor, server.metrics)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local molecular displacement service")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--cache-size', type=int, default=128)
+    args = parser.parse_args()
+
+    server = create_server(args.port, args.workers, args.cache_size)
+    print(f"Serving on http://{HOST}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,22 @@
 import numpy as np
+from utils.pair_functions import ContactBody, contact_displacement, pair_geometry
 
 class Molecule:
     def __init__(self, coordinates, symbols, atom_radii):
         self.coordinates = np.array(coordinates)
         self.symbols = symbols
         self.atom_radii = {symbol: atom_radii.get(symbol, 1.5) for symbol in symbols}
+        self.contact_indices = None
+        self.kept_fraction = None
 
     def get_radius(self, atom_index):
         return self.atom_radii[self.symbols[atom_index]]
 
+    def get_contact_indices(self):
+        if self.contact_indices is None:
+            return range(len(self.coordinates))
+        return self.contact_indices
+
 def read_sdf_from_string(content):
     lines = content.split('\n')
     molecule_data = []
@@ -58,21 +66,78 @@ def read_sdf_from_file(file_path):
                     continue
     return molecule_data
 
-def apply_rotation(molecule, angles):
+def rotation_matrix(angles):
     rx, ry, rz = np.radians(angles)
     Rx = np.array([[1, 0, 0], [0, np.cos(rx), -np.sin(rx)], [0, np.sin(rx), np.cos(rx)]])
     Ry = np.array([[np.cos(ry), 0, np.sin(ry)], [0, 1, 0], [-np.sin(ry), 0, np.cos(ry)]])
     Rz = np.array([[np.cos(rz), -np.sin(rz), 0], [np.sin(rz), np.cos(rz), 0], [0, 0, 1]])
-    R = np.dot(Rz, np.dot(Ry, Rx))
+    return np.dot(Rz, np.dot(Ry, Rx))
+
+def apply_rotation(molecule, angles):
+    R = rotation_matrix(angles)
     rotated_coords = np.dot(molecule.coordinates, R.T)
-    return Molecule(rotated_coords, molecule.symbols, molecule.atom_radii)
+    rotated = Molecule(rotated_coords, molecule.symbols, molecule.atom_radii)
+    # Burial does not depend on orientation, so the reduced atom set carries over.
+    rotated.contact_indices = molecule.contact_indices
+    rotated.kept_fraction = molecule.kept_fraction
+    return rotated
+
+def find_buried_atoms(molecule, n_theta=25, n_phi=48):
+    """
+    Flags atoms whose whole vdW surface lies inside the spheres of the remaining atoms.
+
+    The last contact of any pair is a tangency point on the surface of both spheres,
+    so a pair involving a covered atom is always matched by a pair of kept atoms and
+    the maximum displacement is unchanged. Atoms are removed one at a time and each
+    is tested only against atoms still kept, so mutually covering atoms are never
+    dropped together. The surface is sampled on a (theta, phi) grid and every sample
+    must lie inside a neighbor by at least the grid's covering radius, which makes
+    the test conservative rather than approximate.
+
+    With vdW radii and covalent bond lengths the outward cap of an atom is rarely
+    covered, so ordinary molecules often keep every atom (all the bundled SDF files
+    do); the reduction is opt-in through reduce_molecule.
+    """
+    coordinates = np.asarray(molecule.coordinates, dtype=float)
+    n_atoms = len(coordinates)
+    radii = np.array([molecule.get_radius(i) for i in range(n_atoms)], dtype=float)
+
+    theta = np.linspace(0, np.pi, n_theta)
+    phi = np.arange(n_phi) * 2 * np.pi / n_phi
+    theta, phi = np.meshgrid(theta, phi, indexing='ij')
+    unit_points = np.stack([np.sin(theta) * np.cos(phi),
+                            np.sin(theta) * np.sin(phi),
+                            np.cos(theta)], axis=-1).reshape(-1, 3)
+    # Any point of the unit sphere is within this arc length of a grid point.
+    covering = (np.pi / (n_theta - 1) + 2 * np.pi / n_phi) / 2
+
+    kept = np.ones(n_atoms, dtype=bool)
+    for j in np.argsort(radii, kind='stable'):
+        slack = radii[j] * covering
+        distances = np.linalg.norm(coordinates - coordinates[j], axis=1)
+        neighbors = kept & (distances < radii + radii[j]) & (radii > slack)
+        neighbors[j] = False
+        if not neighbors.any():
+            continue
+        points = coordinates[j] + radii[j] * unit_points
+        to_neighbors = np.linalg.norm(points[:, None, :] - coordinates[neighbors][None, :, :], axis=2)
+        if np.all(np.any(to_neighbors <= radii[neighbors] - slack, axis=1)):
+            kept[j] = False
+    return ~kept
+
+def reduce_molecule(molecule, n_theta=25, n_phi=48):
+    """Caches the non-buried atoms on the molecule and returns the fraction of atoms kept."""
+    buried = find_buried_atoms(molecule, n_theta, n_phi)
+    molecule.contact_indices = np.flatnonzero(~buried)
+    molecule.kept_fraction = len(molecule.contact_indices) / max(len(buried), 1)
+    return molecule.kept_fraction
 
 def calculate_contact(molecule, direction_vector):
-    n_atoms = len(molecule.coordinates)
+    contact_indices = molecule.get_contact_indices()
     max_displacement = 0
 
-    for i in range(n_atoms):
-        for j in range( n_atoms):
+    for i in contact_indices:
+        for j in contact_indices:
             distance_vector = molecule.coordinates[i] - molecule.coordinates[j]
             distance = np.linalg.norm(distance_vector)
             projection = np.dot(distance_vector, direction_vector) / np.linalg.norm(direction_vector)
@@ -88,6 +153,56 @@ def calculate_contact(molecule, direction_vector):
 
 
 
+class IncrementalContact:
+    """
+    Warm-started calculate_contact for sequences of nearby orientations.
+
+    Rotating the molecule by R and displacing along v is the same as displacing the
+    unrotated molecule along w = R^T v. Around a reference direction w0, any w with
+    |w - w0| <= eps moves a pair's contact interval by at most eps * (|d| + sum_vdw),
+    so its displacement is bounded by the pair's displacement along w0 with the vdW
+    sum inflated (upper bound) or shrunk (lower bound) by that amount. Pairs whose
+    upper bound stays below the best lower bound can never set the maximum inside
+    the region and are skipped until the direction leaves it.
+    """
+
+    def __init__(self, molecule, radius_degrees=5):
+        body = ContactBody(molecule)
+        diff, distance2, sum_vdw = pair_geometry(body, body)
+        self._diff = diff.reshape(-1, 3)
+        self._distance2 = distance2.ravel()
+        self._sum_vdw = sum_vdw.ravel()
+        self._reach = np.sqrt(self._distance2) + self._sum_vdw
+        self.radius = 2 * np.sin(np.radians(radius_degrees) / 2)
+        self.reference = None
+        self.candidates = None
+        self.full_scans = 0
+
+    def _rebuild(self, direction):
+        projection = np.dot(self._diff, direction)
+        slack = self.radius * self._reach
+        upper = contact_displacement(projection, self._distance2, self._sum_vdw + slack)
+        lower = contact_displacement(projection, self._distance2, self._sum_vdw - slack)
+        self.candidates = np.flatnonzero(upper >= lower.max(initial=0))
+        self.reference = direction
+        self.full_scans += 1
+
+    def calculate(self, direction_vector, angles=(0, 0, 0)):
+        direction = np.asarray(direction_vector, dtype=float)
+        norm = np.linalg.norm(direction)
+        if not np.isfinite(norm) or norm == 0:
+            # Same result as calculate_contact for a zero direction, without touching the reference.
+            return 0
+        direction = np.dot(direction / norm, rotation_matrix(angles))
+        if self.reference is None or np.linalg.norm(direction - self.reference) > self.radius:
+            self._rebuild(direction)
+        candidates = self.candidates
+        projection = np.dot(self._diff[candidates], direction)
+        displacements = contact_displacement(projection, self._distance2[candidates],
+                                             self._sum_vdw[candidates])
+        return displacements.max(initial=0)
+
+
 def generate_xyz_data(molecule):
     xyz_data = ""
     for i in range(len(molecule.coordinates)):
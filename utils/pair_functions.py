@@ -0,0 +1,141 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Upper bound on the number of (atom_a, atom_b, direction) entries evaluated at once.
+_MAX_BLOCK = 4_000_000
+
+
+class ContactBody:
+    """Per-molecule data reused by every pair evaluation that involves the molecule."""
+
+    def __init__(self, molecule):
+        indices = np.asarray(molecule.get_contact_indices(), dtype=int)
+        coordinates = np.asarray(molecule.coordinates, dtype=float)
+        self.coordinates = np.ascontiguousarray(coordinates[indices])
+        self.radii = np.array([molecule.get_radius(i) for i in indices], dtype=float)
+        self._self_geometry = None
+
+    def self_geometry(self):
+        """pair_geometry of the molecule against itself, computed once and kept."""
+        if self._self_geometry is None:
+            self._self_geometry = pair_geometry(self, self)
+        return self._self_geometry
+
+
+def _as_body(molecule):
+    return molecule if isinstance(molecule, ContactBody) else ContactBody(molecule)
+
+
+def _unit_directions(direction_vector):
+    directions = np.atleast_2d(np.asarray(direction_vector, dtype=float))
+    return directions / np.linalg.norm(directions, axis=1)[:, None]
+
+
+def pair_geometry(body_a, body_b):
+    """Pair difference vectors a_i - b_j, their squared lengths and the vdW sums."""
+    diff = body_a.coordinates[:, None, :] - body_b.coordinates[None, :, :]
+    distance2 = np.einsum('ijk,ijk->ij', diff, diff)
+    sum_vdw = body_a.radii[:, None] + body_b.radii[None, :]
+    return diff, distance2, sum_vdw
+
+
+def contact_displacement(projection, distance2, sum_vdw):
+    """
+    Per-pair displacement along a unit direction, floored at 0 like calculate_contact.
+
+    Pairs outside the contact cylinder (or with a negative vdW sum) give 0.
+    """
+    # sum_vdw**2 - normal_distance**2, with normal_distance**2 = distance**2 - projection**2
+    root2 = sum_vdw ** 2 - distance2 + projection ** 2
+    contact = (root2 >= 0) & (sum_vdw >= 0)
+    root = np.sqrt(np.where(contact, root2, 0))
+    return np.where(contact, np.maximum(projection + root, 0), 0)
+
+
+def _pair_displacements(body_a, body_b, directions, both=False):
+    """
+    Displacements of B relative to A along each direction, and optionally its opposite.
+
+    Returns (forward, backward) with forward[k] = d_AB(v_k). With both=True,
+    backward[k] = d_AB(-v_k) = d_BA(v_k) comes from the same pair distances;
+    otherwise backward is None.
+    """
+    n_directions = len(directions)
+    forward = np.zeros(n_directions)
+    backward = np.zeros(n_directions) if both else None
+    if len(body_a.coordinates) == 0 or len(body_b.coordinates) == 0:
+        return forward, backward
+
+    if body_a is body_b:
+        diff, distance2, sum_vdw = body_a.self_geometry()
+    else:
+        diff, distance2, sum_vdw = pair_geometry(body_a, body_b)
+    step = max(1, _MAX_BLOCK // distance2.size)
+    distance2 = distance2[..., None]
+    sum_vdw = sum_vdw[..., None]
+    for start in range(0, n_directions, step):
+        projection = np.tensordot(diff, directions[start:start + step], axes=([2], [1]))
+        forward[start:start + step] = contact_displacement(projection, distance2, sum_vdw).max(axis=(0, 1))
+        if both:
+            backward[start:start + step] = contact_displacement(-projection, distance2, sum_vdw).max(axis=(0, 1))
+    return forward, backward
+
+
+def calculate_pair_contact(molecule_a, molecule_b, direction_vector):
+    """Maximum displacement of molecule B along the direction until it no longer touches A."""
+    forward, _ = _pair_displacements(_as_body(molecule_a), _as_body(molecule_b),
+                                     _unit_directions(direction_vector))
+    return forward[0] if np.ndim(direction_vector) == 1 else forward
+
+
+def _evaluate_pairs(bodies, directions, pairs):
+    # The diagonal has no distinct mirror entry, so only off-diagonal pairs need -v.
+    return [(a, b) + _pair_displacements(bodies[a], bodies[b], directions, both=a != b)
+            for a, b in pairs]
+
+
+_worker_state = {}
+
+
+def _init_worker(bodies, directions):
+    _worker_state['bodies'] = bodies
+    _worker_state['directions'] = directions
+
+
+def _evaluate_chunk(pairs):
+    return _evaluate_pairs(_worker_state['bodies'], _worker_state['directions'], pairs)
+
+
+def contact_matrix(molecules, direction_vector, n_jobs=None):
+    """
+    L x L matrix of pair displacements for a library of molecules.
+
+    Entry [a, b] is the displacement of molecule b relative to molecule a along the
+    direction. Only the upper triangle is evaluated, since d_BA(v) = d_AB(-v). With
+    several directions (shape (K, 3)) the result has shape (L, L, K). Pairs are spread
+    over n_jobs processes (all cores by default, 1 to stay in-process).
+    """
+    bodies = [_as_body(molecule) for molecule in molecules]
+    directions = _unit_directions(direction_vector)
+    n_molecules = len(bodies)
+    pairs = [(a, b) for a in range(n_molecules) for b in range(a, n_molecules)]
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or len(pairs) < 2:
+        results = _evaluate_pairs(bodies, directions, pairs)
+    else:
+        n_chunks = min(len(pairs), 4 * n_jobs)
+        chunks = [pairs[k::n_chunks] for k in range(n_chunks)]
+        results = []
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(bodies, directions)) as executor:
+            for chunk_results in executor.map(_evaluate_chunk, chunks):
+                results.extend(chunk_results)
+
+    matrix = np.zeros((n_molecules, n_molecules, len(directions)))
+    for a, b, forward, backward in results:
+        matrix[a, b] = forward
+        if a != b:
+            matrix[b, a] = backward
+    return matrix[:, :, 0] if np.ndim(direction_vector) == 1 else matrix